@@ -1,56 +1,105 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import redis
-import json
+import redis.asyncio as aioredis
 import asyncio
-from datetime import datetime
+import logging
+import orjson
+import time
 from typing import Dict, Optional
+from pydantic import ValidationError
 
 from services.bid_service import BidService
+from services.cache_invalidator import CacheInvalidator
 from services.connection_manager import ConnectionManager
+from services.logging_config import setup_logging
+from services.migration import migrate_legacy_layout
+from services.models import BidSubmit, submission_error
 from services.stream_processor import StreamProcessor
-from services.config import REDIS_HOST, REDIS_PORT, STREAM_NAME
+from services.config import (
+    REDIS_HOST, REDIS_PORT, REDIS_MAX_CONNECTIONS, REDIS_POOL_TIMEOUT, STREAM_NAME, HIGHEST_BID_KEY, BID_HISTORY_LIMIT
+)
+
+log_listener = setup_logging()
+logger = logging.getLogger(__name__)
+
+# Blocking pool: when every connection is busy, callers wait instead of failing
+redis_pool = aioredis.BlockingConnectionPool(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=REDIS_POOL_TIMEOUT,
+    socket_keepalive=True,
+    decode_responses=False
+)
+redis_client = aioredis.Redis(connection_pool=redis_pool)
 
-redis_client = redis.Redis(
+# XREAD BLOCK parks its connection, so the stream consumer gets its own
+stream_redis_client = aioredis.Redis(
     host=REDIS_HOST,
     port=REDIS_PORT,
-    decode_responses=True
+    socket_keepalive=True,
+    single_connection_client=True,
+    decode_responses=False
+)
+
+# CLIENT TRACKING state lives on one connection, which has to stay open
+tracking_redis_client = aioredis.Redis(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    socket_keepalive=True,
+    single_connection_client=True,
+    decode_responses=False
 )
 
 bid_service = BidService(redis_client)
 connection_manager = ConnectionManager()
-stream_processor = StreamProcessor(redis_client, connection_manager, STREAM_NAME)
+stream_processor = StreamProcessor(stream_redis_client, connection_manager, STREAM_NAME, bid_service)
+cache_invalidator = CacheInvalidator(tracking_redis_client, bid_service, HIGHEST_BID_KEY)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    background_task = None
+    background_tasks = []
     
+    logger.info("STARTUP: Initializing application...")
     try:
-        print("STARTUP: Initializing application...", flush=True)
-        redis_client.ping()
-        print("✓ Redis connection successful", flush=True)
-        background_task = asyncio.create_task(stream_processor.process_messages())
-        print("✓ Started stream processor", flush=True)
-        print("STARTUP: Complete!", flush=True)
+        await redis_client.ping()
+        logger.info("✓ Redis connection successful")
+        await migrate_legacy_layout(redis_client)
     except Exception as e:
-        print(f"✗ Startup error: {e}", flush=True)
-        import traceback
-        traceback.print_exc()
+        logger.exception("✗ Startup error: %s", e)
+    
+    # Both loops retry on their own, so they start even if the setup above failed
+    background_tasks.append(asyncio.create_task(stream_processor.process_messages()))
+    logger.info("✓ Started stream processor")
+    background_tasks.append(asyncio.create_task(cache_invalidator.listen()))
+    logger.info("✓ Started cache invalidator")
+    logger.info("STARTUP: Complete!")
     
     yield
     
-    print("Shutting down...", flush=True)
-    if background_task:
-        background_task.cancel()
+    logger.info("Shutting down...")
+    for task in background_tasks:
+        task.cancel()
         try:
-            await background_task
+            await task
         except asyncio.CancelledError:
             pass
+    await tracking_redis_client.aclose()
+    await stream_redis_client.aclose()
+    await redis_client.aclose()
+    await redis_pool.disconnect()
+    log_listener.stop()
 
 
-app = FastAPI(title="Bidding Application", lifespan=lifespan)
+app = FastAPI(
+    title="Bidding Application",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -69,7 +118,7 @@ async def root():
 @app.get("/health")
 async def health_check():
     try:
-        redis_client.ping()
+        await redis_client.ping()
         redis_status = "connected"
     except:
         redis_status = "disconnected"
@@ -78,16 +127,45 @@ async def health_check():
 
 
 @app.get("/api/bids/highest")
-async def get_highest_bid():
-    bid = bid_service.get_highest_bid()
-    if bid:
-        return bid
-    return {"amount": 0, "bidder": None, "timestamp": None, "bid_id": None}
+async def get_highest_bid(request: Request):
+    bid = await bid_service.get_highest_bid()
+    etag = bid_service.etag_for(bid)
+    if _is_not_modified(request, etag):
+        return Response(status_code=304, headers=_cache_headers(etag))
+    
+    content = orjson.dumps(bid or {"amount": 0, "bidder": None, "timestamp": None, "bid_id": None})
+    return Response(content=content, media_type="application/json", headers=_cache_headers(etag))
 
 
 @app.get("/api/bids/history")
-async def get_bid_history(limit: int = 50):
-    return {"history": bid_service.get_bid_history(limit)}
+async def get_bid_history(request: Request, limit: int = Query(BID_HISTORY_LIMIT, ge=0)):
+    history = await bid_service.get_bid_history(limit)
+    # Tag the data actually served; the highest bid can run ahead of the history
+    etag = bid_service.etag_for(history[0] if history else None)
+    if _is_not_modified(request, etag):
+        return Response(status_code=304, headers=_cache_headers(etag))
+    
+    if limit < BID_HISTORY_LIMIT:
+        content = orjson.dumps({"history": history})
+    else:
+        # Full history is pre-serialized, skip FastAPI's encoder entirely.
+        # No await since the snapshot above, so the bytes match the ETag
+        content = bid_service.get_bid_history_bytes()
+    return Response(content=content, media_type="application/json", headers=_cache_headers(etag))
+
+
+def _cache_headers(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": "public, max-age=1"}
+
+
+def _is_not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Compare weakly, proxies may add a W/ prefix when they compress the body
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
 
 
 @app.websocket("/ws/bid")
@@ -95,10 +173,10 @@ async def websocket_endpoint(websocket: WebSocket):
     await connection_manager.connect(websocket)
     
     try:
-        highest_bid = bid_service.get_highest_bid()
-        history = bid_service.get_bid_history(50)
+        highest_bid = await bid_service.get_highest_bid()
+        history = await bid_service.get_bid_history()
         
-        await websocket.send_text(json.dumps({
+        await websocket.send_bytes(orjson.dumps({
             "type": "initial_state",
             "data": {
                 "highest_bid": highest_bid or {"amount": 0, "bidder": None, "timestamp": None, "bid_id": None},
@@ -108,60 +186,58 @@ async def websocket_endpoint(websocket: WebSocket):
         
         while True:
             data = await websocket.receive_text()
-            message = json.loads(data)
             
-            if message.get("type") == "submit_bid":
-                error = await _validate_and_process_bid(message, websocket)
-                if error:
-                    await connection_manager.send_message(json.dumps({
-                        "type": "error",
-                        "message": error
-                    }), websocket)
+            # Parse and validate in a single pass, no intermediate dict
+            try:
+                submission = BidSubmit.model_validate_json(data)
+            except ValidationError as e:
+                error = submission_error(e)
+            else:
+                try:
+                    error = await _validate_and_process_bid(submission, websocket)
+                except redis.RedisError as e:
+                    logger.error("Redis error while placing bid: %s", e)
+                    error = "Bid could not be placed right now, please try again"
+            
+            if error:
+                await connection_manager.send_message(orjson.dumps({
+                    "type": "error",
+                    "message": error
+                }), websocket)
     
     except WebSocketDisconnect:
         connection_manager.disconnect(websocket)
     except Exception as e:
-        print(f"WebSocket error: {e}")
+        logger.error("WebSocket error: %s", e)
         connection_manager.disconnect(websocket)
 
 
-async def _validate_and_process_bid(message: Dict, websocket: WebSocket) -> Optional[str]:
-    bidder = message.get("bidder", "").strip()
-    
-    try:
-        amount = float(message.get("amount", 0))
-    except (ValueError, TypeError):
-        return "Invalid bid amount"
-    
-    if not bidder:
-        return "Bidder name is required"
-    
+async def _validate_and_process_bid(submission: BidSubmit, websocket: WebSocket) -> Optional[str]:
+    amount = submission.amount_cents
     if amount <= 0:
         return "Bid amount must be greater than 0"
     
-    current_highest = bid_service.get_highest_bid()
+    current_highest = await bid_service.get_highest_bid()
     current_amount = current_highest.get("amount", 0) if current_highest else 0
     
     if amount <= current_amount:
-        return f"Bid must be higher than current highest bid (${current_amount:.2f})"
+        return f"Bid must be higher than current highest bid (${current_amount / 100:.2f})"
     
     bid_data = {
-        "bid_id": bid_service.generate_bid_id(),
-        "bidder": bidder,
+        "bidder": submission.bidder,
         "amount": amount,
-        "timestamp": datetime.utcnow().isoformat()
+        # Epoch milliseconds: cheap to produce and fits a JS Date without precision loss
+        "timestamp": time.time_ns() // 1_000_000
     }
     
-    success = bid_service.save_bid_atomic(bid_data)
+    success = await bid_service.save_bid_atomic(bid_data)
     
     if not success:
-        current_highest = bid_service.get_highest_bid()
+        current_highest = await bid_service.get_highest_bid()
         current_amount = current_highest.get("amount", 0) if current_highest else 0
-        return f"Bid must be higher than current highest bid (${current_amount:.2f})"
-    
-    bid_service.add_to_stream(STREAM_NAME, bid_data)
+        return f"Bid must be higher than current highest bid (${current_amount / 100:.2f})"
     
-    await connection_manager.send_message(json.dumps({
+    await connection_manager.send_message(orjson.dumps({
         "type": "bid_accepted",
         "data": bid_data
     }), websocket)
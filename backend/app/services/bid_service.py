@@ -1,96 +1,202 @@
+import asyncio
+import logging
 import redis
-import json
+import redis.asyncio as aioredis
+import msgpack
+import orjson
+from collections import deque
+from itertools import islice
 from typing import List, Dict, Optional
-from .config import HIGHEST_BID_KEY, BID_HISTORY_KEY, BID_COUNTER_KEY
+from .config import HIGHEST_BID_KEY, BID_HISTORY_LIMIT, STREAM_NAME, STREAM_MAXLEN
+
+logger = logging.getLogger(__name__)
+
+# KEYS: highest bid, stream
+# ARGV: packed bid (without bid_id), amount in cents, bidder, timestamp, stream maxlen
+# Returns the stream entry ID, which doubles as the bid_id, or nil if the bid is too low
+PLACE_BID_LUA = """
+local cur = redis.call('GET', KEYS[1])
+if cur then
+    -- A value that does not decode to a bid is treated as absent
+    local ok, c = pcall(cmsgpack.unpack, cur)
+    if ok and type(c) == 'table' and tonumber(c.amount) and tonumber(ARGV[2]) <= tonumber(c.amount) then
+        return false
+    end
+end
+local id = redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[5], '*',
+    'bidder', ARGV[3], 'amount', ARGV[2], 'timestamp', ARGV[4])
+local bid = cmsgpack.unpack(ARGV[1])
+bid.bid_id = id
+redis.call('SET', KEYS[1], cmsgpack.pack(bid))
+return id
+"""
+
+
+def parse_stream_entry(msg_id: bytes, fields: Dict[bytes, bytes]) -> Dict:
+    # Client runs with decode_responses=False, so field names and values are bytes;
+    # int() parses the cents and millisecond fields straight from bytes
+    get = fields.get
+    return {
+        # The stream entry ID is the bid_id
+        "bid_id": msg_id.decode(),
+        "bidder": get(b"bidder", b"").decode(),
+        "amount": int(get(b"amount", 0)),
+        "timestamp": int(get(b"timestamp", 0))
+    }
 
 class BidService:
     
-    def __init__(self, redis_client: redis.Redis):
+    def __init__(self, redis_client: aioredis.Redis):
         self.redis = redis_client
         self.highest_bid_key = HIGHEST_BID_KEY
-        self.bid_history_key = BID_HISTORY_KEY
-        self.bid_counter_key = BID_COUNTER_KEY
+        self.stream_name = STREAM_NAME
+        self._place_bid_sha: Optional[str] = None
+        self._cached_highest: Optional[Dict] = None
+        self._history: deque = deque(maxlen=BID_HISTORY_LIMIT)
+        self._history_loaded = False
+        self._history_lock = asyncio.Lock()
+        # Bids the stream delivers while the initial XREVRANGE is in flight
+        self._history_pending: Optional[List[Dict]] = None
+        self._history_bytes: Optional[bytes] = None
+    
+    async def get_highest_bid(self) -> Optional[Dict]:
+        if self._cached_highest is not None:
+            return self._cached_highest
+        
+        bid_data = await self.redis.get(self.highest_bid_key)
+        fetched = self._unpack(bid_data) if bid_data else None
+        # The stream may have delivered a newer bid while the GET was in flight,
+        # so merge rather than overwrite to never step back to a lower bid
+        if fetched is not None:
+            self.update_cached_highest(fetched)
+        return self._cached_highest
+    
+    @staticmethod
+    def etag_for(latest_bid: Optional[Dict]) -> str:
+        """
+        Version tag for a response whose newest bid is latest_bid. The bid_id is
+        a stream entry ID, so it changes with every new bid and matches across pods.
+        """
+        bid_id = latest_bid.get("bid_id") if latest_bid else None
+        return f'"{bid_id}"' if bid_id else '"0"'
+    
+    def invalidate_highest(self) -> None:
+        self._cached_highest = None
     
-    def get_highest_bid(self) -> Optional[Dict]:
-        bid_data = self.redis.get(self.highest_bid_key)
-        return json.loads(bid_data) if bid_data else None
+    def update_cached_highest(self, bid_data: Dict) -> None:
+        """Keep the in-process highest bid in sync with bids seen on the stream."""
+        cached = self._cached_highest
+        if cached is None or bid_data["amount"] > cached.get("amount", 0):
+            self._cached_highest = bid_data
     
-    def get_bid_history(self, limit: int = 50) -> List[Dict]:
-        history = self.redis.lrange(self.bid_history_key, 0, limit - 1)
-        return [json.loads(bid) for bid in history]
+    async def get_bid_history(self, limit: int = BID_HISTORY_LIMIT) -> List[Dict]:
+        if not self._history_loaded:
+            async with self._history_lock:
+                if not self._history_loaded:
+                    await self._load_history()
+        return list(islice(self._history, limit))
     
-    def save_bid(self, bid_data: Dict) -> None:
-        pipe = self.redis.pipeline()
-        pipe.set(self.highest_bid_key, json.dumps(bid_data))
-        pipe.lpush(self.bid_history_key, json.dumps(bid_data))
-        pipe.ltrim(self.bid_history_key, 0, 49)
-        pipe.execute()
+    async def _load_history(self) -> None:
+        self._history_pending = []
+        try:
+            # The stream doubles as the history, newest entries first
+            entries = await self.redis.xrevrange(self.stream_name, count=BID_HISTORY_LIMIT)
+            self._history.clear()
+            for msg_id, fields in entries:
+                # Skip entries written by older versions rather than failing the whole load
+                try:
+                    self._history.append(parse_stream_entry(msg_id, fields))
+                except ValueError as e:
+                    logger.warning("Skipping unparsable stream entry %s: %s", msg_id.decode(), e)
+            
+            # XREVRANGE runs on another connection than the stream consumer, so
+            # bids delivered meanwhile may or may not be in the result
+            seen = {bid["bid_id"] for bid in self._history}
+            for bid_data in self._history_pending:
+                if bid_data["bid_id"] not in seen:
+                    self._history.appendleft(bid_data)
+            
+            self._history_loaded = True
+            self._history_bytes = None
+        finally:
+            self._history_pending = None
+    
+    def get_bid_history_bytes(self) -> bytes:
+        """
+        Full history as a ready-to-send JSON body, serialized once per new bid.
+        Synchronous, so it matches a get_bid_history() result taken just before.
+        """
+        if self._history_bytes is None:
+            self._history_bytes = orjson.dumps({"history": list(self._history)})
+        return self._history_bytes
     
-    def save_bid_atomic(self, bid_data: Dict, max_retries: int = 3) -> bool:
+    def add_to_history(self, bid_data: Dict) -> None:
+        # Until the first load, Redis already holds everything the stream delivers
+        if not self._history_loaded:
+            if self._history_pending is not None:
+                self._history_pending.append(bid_data)
+            return
+        self._history.appendleft(bid_data)
+        self._history_bytes = None
+    
+    async def save_bid_atomic(self, bid_data: Dict) -> bool:
         """
         Atomically save bid only if it's higher than current highest bid.
-        Uses Redis WATCH/MULTI/EXEC for optimistic locking to prevent race conditions.
+        Runs compare, save and stream publish as one server-side Lua script,
+        so the whole critical section costs a single round trip.
         
         Args:
-            bid_data: Dictionary containing bid information (must include 'amount')
-            max_retries: Maximum number of retry attempts if WatchError occurs
+            bid_data: Dictionary containing bid information (must include 'amount' in integer cents).
+                On success its 'bid_id' is set to the generated stream entry ID.
             
         Returns:
-            True if bid was successfully saved, False if bid is too low or max retries exceeded
+            True if bid was successfully saved, False if bid is too low
+        
+        Raises:
+            redis.RedisError: If Redis could not be reached or the script failed
         """
-        bid_amount = float(bid_data.get("amount", 0))
-        bid_json = json.dumps(bid_data)
+        keys = [self.highest_bid_key, self.stream_name]
+        args = [
+            self._pack(bid_data),
+            str(bid_data["amount"]),
+            bid_data["bidder"],
+            bid_data["timestamp"],
+            STREAM_MAXLEN
+        ]
         
-        for attempt in range(max_retries):
-            try:
-                # Watch the highest_bid key for changes
-                pipe = self.redis.pipeline()
-                pipe.watch(self.highest_bid_key)
-                
-                # Get current highest bid
-                current_data = pipe.get(self.highest_bid_key)
-                current_amount = 0.0
-                if current_data:
-                    current_bid = json.loads(current_data)
-                    current_amount = float(current_bid.get("amount", 0))
-                
-                # Validate that new bid is higher than current
-                if bid_amount <= current_amount:
-                    pipe.unwatch()
-                    return False  # Bid too low
-                
-                # Start transaction
-                pipe.multi()
-                pipe.set(self.highest_bid_key, bid_json)
-                pipe.lpush(self.bid_history_key, bid_json)
-                pipe.ltrim(self.bid_history_key, 0, 49)  # Keep last 50 bids
-                
-                # Execute transaction (will raise WatchError if key was modified)
-                pipe.execute()
-                return True  # Successfully saved
-                
-            except redis.WatchError:
-                # Another process modified the highest_bid key, retry
-                if attempt < max_retries - 1:
-                    continue  # Retry
-                else:
-                    # Max retries exceeded
-                    return False
-            except Exception as e:
-                # Unexpected error, log and return False
-                print(f"Error in save_bid_atomic: {e}", flush=True)
-                return False
+        bid_id = await self._run_place_bid(keys, args)
         
-        return False
+        saved = bid_id is not None
+        if saved:
+            bid_data["bid_id"] = bid_id.decode()
+            self.update_cached_highest(bid_data)
+        else:
+            # Someone outbid us before the stream caught up, reload from Redis
+            self.invalidate_highest()
+        return saved
     
-    def generate_bid_id(self) -> str:
-        return str(self.redis.incr(self.bid_counter_key))
+    async def _run_place_bid(self, keys: List[str], args: List) -> Optional[bytes]:
+        if self._place_bid_sha is None:
+            self._place_bid_sha = await self.redis.script_load(PLACE_BID_LUA)
+        
+        try:
+            return await self.redis.evalsha(self._place_bid_sha, len(keys), *keys, *args)
+        except redis.exceptions.NoScriptError:
+            # Script cache was flushed (e.g. Redis restart), EVAL reloads it
+            return await self.redis.eval(PLACE_BID_LUA, len(keys), *keys, *args)
     
-    def add_to_stream(self, stream_name: str, bid_data: Dict) -> None:
-        self.redis.xadd(stream_name, {
-            "bid_id": bid_data["bid_id"],
-            "bidder": bid_data["bidder"],
-            "amount": str(bid_data["amount"]),
-            "timestamp": bid_data["timestamp"]
-        })
-
+    @staticmethod
+    def _pack(bid_data: Dict) -> bytes:
+        return msgpack.packb(bid_data, use_bin_type=True)
+    
+    @staticmethod
+    def _unpack(data: bytes) -> Optional[Dict]:
+        try:
+            bid_data = msgpack.unpackb(data, raw=False)
+        except (ValueError, msgpack.UnpackException) as e:
+            logger.warning("Ignoring undecodable highest bid: %s", e)
+            return None
+        if not isinstance(bid_data, dict) or "amount" not in bid_data:
+            logger.warning("Ignoring malformed highest bid: %r", bid_data)
+            return None
+        return bid_data
@@ -0,0 +1,59 @@
+import redis.asyncio as aioredis
+import asyncio
+import logging
+from .bid_service import BidService
+
+logger = logging.getLogger(__name__)
+
+INVALIDATE_CHANNEL = "__redis__:invalidate"
+
+
+class CacheInvalidator:
+    """
+    Server-assisted client-side caching for the highest bid.
+    
+    Redis tracks the key prefix in BCAST mode and redirects an invalidation
+    message to our pub/sub connection on every write, so the in-process
+    cache stays coherent without polling.
+    """
+    
+    def __init__(self, redis_client: aioredis.Redis, bid_service: BidService, prefix: str):
+        # Tracking is per connection, so this must be a single_connection_client
+        self.redis = redis_client
+        self.bid_service = bid_service
+        self.prefix = prefix
+    
+    async def listen(self):
+        logger.info("Cache invalidator started, tracking keys...")
+        
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                # The redirect target is the pub/sub connection's client ID,
+                # which has to be read before it enters subscribe mode
+                await pubsub.connect()
+                await pubsub.connection.send_command("CLIENT", "ID")
+                client_id = await pubsub.connection.read_response()
+                await pubsub.subscribe(INVALIDATE_CHANNEL)
+                # Tracking may still be on from a previous attempt, and Redis rejects
+                # re-adding an overlapping prefix, so reset it before redirecting
+                await self.redis.client_tracking_off()
+                await self.redis.client_tracking_on(clientid=client_id, bcast=True, prefix=[self.prefix])
+                
+                # Writes made before tracking started were never announced
+                self.bid_service.invalidate_highest()
+                
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.bid_service.invalidate_highest()
+            
+            except asyncio.CancelledError:
+                logger.info("Cache invalidator stopped")
+                break
+            except Exception as e:
+                # Invalidations may have been missed while disconnected
+                self.bid_service.invalidate_highest()
+                logger.error("Cache invalidation error: %s", e)
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.reset()
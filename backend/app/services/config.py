@@ -4,10 +4,22 @@ import os
 # Redis configuration
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 64))
+# Seconds to wait for a free pooled connection before giving up
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 5))
 
 # Stream configuration
-STREAM_NAME = "bids_stream"
-HIGHEST_BID_KEY = "highest_bid"
-BID_HISTORY_KEY = "bid_history"
-BID_COUNTER_KEY = "bids:counter"
+# MessagePack bids, amounts in integer cents, timestamps in epoch milliseconds
+STREAM_NAME = "bids:stream"
+HIGHEST_BID_KEY = "bids:highest"
+# Original layout: JSON bids, amounts in dollars, ISO timestamps.
+# Copied into the keys above once on startup, then left untouched
+LEGACY_HIGHEST_BID_KEY = "highest_bid"
+LEGACY_BID_HISTORY_KEY = "bid_history"
+MIGRATION_DONE_KEY = "bids:migrated"
+BID_HISTORY_LIMIT = 50
+# Upper bound in dollars, keeps cents exact in a double and within msgpack's int64
+MAX_BID_AMOUNT = 1_000_000_000
+# Approximate cap, lets Redis trim whole macro nodes in O(1)
+STREAM_MAXLEN = 500
 
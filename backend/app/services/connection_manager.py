@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import WebSocket
 from typing import List
 
@@ -15,20 +16,20 @@ class ConnectionManager:
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
     
-    async def send_message(self, message: str, websocket: WebSocket):
+    async def send_message(self, payload: bytes, websocket: WebSocket):
         try:
-            await websocket.send_text(message)
+            await websocket.send_bytes(payload)
         except:
             self.disconnect(websocket)
     
-    async def broadcast(self, message: str):
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                disconnected.append(connection)
+    async def broadcast(self, payload: bytes):
+        connections = list(self.active_connections)
+        results = await asyncio.gather(
+            *(connection.send_bytes(payload) for connection in connections),
+            return_exceptions=True
+        )
         
-        for conn in disconnected:
-            self.disconnect(conn)
+        for conn, result in zip(connections, results):
+            if isinstance(result, Exception):
+                self.disconnect(conn)
 
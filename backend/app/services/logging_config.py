@@ -0,0 +1,30 @@
+"""Logging setup"""
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+def setup_logging(level: int = logging.INFO) -> QueueListener:
+    """
+    Route all records through an in-memory queue so the event loop never
+    blocks on stdout; a background listener thread does the actual writes.
+    
+    Returns:
+        The listener, already started. Call stop() on shutdown to flush it.
+    """
+    log_queue: queue.Queue = queue.Queue(-1)
+    
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    
+    # Not basicConfig: it would give the QueueHandler a formatter and every
+    # record would be formatted twice, once on the loop and once in the listener
+    root = logging.getLogger()
+    root.handlers = [QueueHandler(log_queue)]
+    root.setLevel(level)
+    
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,116 @@
+import logging
+import redis
+import redis.asyncio as aioredis
+import msgpack
+import orjson
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from .config import (
+    HIGHEST_BID_KEY, STREAM_NAME, BID_HISTORY_LIMIT,
+    LEGACY_HIGHEST_BID_KEY, LEGACY_BID_HISTORY_KEY, MIGRATION_DONE_KEY
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def migrate_legacy_layout(redis_client: aioredis.Redis, max_retries: int = 3) -> None:
+    """
+    One-time copy of the original JSON layout into the current one.
+    
+    The legacy highest bid is converted to MessagePack cents under HIGHEST_BID_KEY,
+    and the legacy history list seeds the bid stream. Legacy keys are left in place.
+    Runs under WATCH, so concurrent pods or live bids never get overwritten.
+    """
+    for attempt in range(max_retries):
+        try:
+            async with redis_client.pipeline(transaction=True) as pipe:
+                await pipe.watch(MIGRATION_DONE_KEY, HIGHEST_BID_KEY, STREAM_NAME)
+                if await pipe.exists(MIGRATION_DONE_KEY):
+                    return
+                
+                legacy_highest = await pipe.get(LEGACY_HIGHEST_BID_KEY)
+                legacy_history = await pipe.lrange(LEGACY_BID_HISTORY_KEY, 0, BID_HISTORY_LIMIT - 1)
+                current = await pipe.get(HIGHEST_BID_KEY)
+                stream_length = await pipe.xlen(STREAM_NAME)
+                
+                pipe.multi()
+                
+                # Only seed an empty stream, explicit IDs must exceed any existing entry
+                new_ids: Dict[str, str] = {}
+                if stream_length == 0:
+                    new_ids = _queue_history(pipe, legacy_history)
+                
+                highest = _convert_legacy_bid(legacy_highest) if legacy_highest else None
+                if highest is not None:
+                    legacy_id, bid_data = highest
+                    bid_data["bid_id"] = new_ids.get(legacy_id, f"legacy-{legacy_id}")
+                    if bid_data["amount"] > _current_amount(current):
+                        pipe.set(HIGHEST_BID_KEY, msgpack.packb(bid_data, use_bin_type=True))
+                
+                pipe.set(MIGRATION_DONE_KEY, 1)
+                await pipe.execute()
+                logger.info("Migrated legacy bids: %d history entries", len(new_ids))
+                return
+        
+        except redis.WatchError:
+            # Another pod migrated, or a bid landed meanwhile; re-check from the top
+            continue
+    
+    logger.warning("Legacy bid migration gave up after %d attempts", max_retries)
+
+
+def _queue_history(pipe, legacy_history: List[bytes]) -> Dict[str, str]:
+    """Queue XADDs for the legacy history, oldest first. Returns legacy bid_id -> stream ID."""
+    new_ids = {}
+    last_ms, last_seq = 0, 0
+    
+    for raw in reversed(legacy_history):
+        converted = _convert_legacy_bid(raw)
+        if converted is None:
+            continue
+        legacy_id, bid_data = converted
+        
+        # Stream IDs from the bid timestamps, bumped to stay strictly increasing
+        ms = bid_data["timestamp"]
+        if ms <= last_ms:
+            ms, seq = last_ms, last_seq + 1
+        else:
+            seq = 0
+        last_ms, last_seq = ms, seq
+        
+        stream_id = f"{ms}-{seq}"
+        pipe.xadd(STREAM_NAME, {
+            "bidder": bid_data["bidder"],
+            "amount": str(bid_data["amount"]),
+            "timestamp": bid_data["timestamp"]
+        }, id=stream_id)
+        new_ids[legacy_id] = stream_id
+    
+    return new_ids
+
+
+def _convert_legacy_bid(raw: bytes) -> Optional[Tuple[str, Dict]]:
+    """Legacy JSON bid (dollars, naive UTC ISO timestamp) to (legacy bid_id, current bid)."""
+    try:
+        bid = orjson.loads(raw)
+        timestamp = datetime.fromisoformat(bid["timestamp"])
+        if timestamp.tzinfo is None:
+            # Written with datetime.utcnow()
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        return str(bid.get("bid_id", "")), {
+            "bidder": bid["bidder"],
+            "amount": round(float(bid["amount"]) * 100),
+            "timestamp": int(timestamp.timestamp() * 1000)
+        }
+    except (ValueError, TypeError, KeyError) as e:
+        logger.warning("Skipping unconvertible legacy bid %r: %s", raw, e)
+        return None
+
+
+def _current_amount(packed: Optional[bytes]) -> int:
+    if not packed:
+        return 0
+    try:
+        return int(msgpack.unpackb(packed, raw=False).get("amount", 0))
+    except (ValueError, TypeError, AttributeError, msgpack.UnpackException):
+        return 0
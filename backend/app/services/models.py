@@ -0,0 +1,41 @@
+from typing import Annotated, Literal, Optional
+from pydantic import BaseModel, Field, StringConstraints, ValidationError
+from .config import MAX_BID_AMOUNT
+
+
+class BidSubmit(BaseModel):
+    """Incoming submit_bid message, parsed and validated straight from the raw frame."""
+    
+    type: Literal["submit_bid"]
+    bidder: Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]
+    amount: Annotated[float, Field(gt=0, le=MAX_BID_AMOUNT, allow_inf_nan=False)]
+    
+    @property
+    def amount_cents(self) -> int:
+        """Amount in integer cents, the unit bids are stored and compared in."""
+        return round(self.amount * 100)
+
+
+def submission_error(exc: ValidationError) -> Optional[str]:
+    """
+    Map a BidSubmit validation failure to the message shown to the bidder.
+    
+    Returns:
+        Error message, or None if the frame is not a bid submission at all
+    """
+    errors = {}
+    for error in exc.errors():
+        field = error["loc"][0] if error["loc"] else None
+        errors.setdefault(field, error["type"])
+    
+    if errors.get(None) == "json_invalid":
+        return "Invalid message"
+    if None in errors or "type" in errors:
+        return None
+    if errors.get("amount") == "less_than_equal":
+        return f"Bid amount must not exceed ${MAX_BID_AMOUNT:,.2f}"
+    if "amount" in errors and errors["amount"] != "greater_than":
+        return "Invalid bid amount"
+    if "bidder" in errors:
+        return "Bidder name is required"
+    return "Bid amount must be greater than 0"
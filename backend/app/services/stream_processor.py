@@ -1,64 +1,63 @@
 import redis
+import redis.asyncio as aioredis
 import asyncio
-import json
-from typing import Dict
+import logging
+import orjson
+from typing import Optional
+from .bid_service import BidService, parse_stream_entry
 from .connection_manager import ConnectionManager
 
+logger = logging.getLogger(__name__)
+
 
 class StreamProcessor:
     
-    def __init__(self, redis_client: redis.Redis, connection_manager: ConnectionManager, stream_name: str):
+    def __init__(self, redis_client: aioredis.Redis, connection_manager: ConnectionManager, stream_name: str,
+                 bid_service: Optional[BidService] = None):
         self.redis = redis_client
         self.manager = connection_manager
+        self.bid_service = bid_service
         self.stream_name = stream_name
         self.last_id = "$"
     
     async def process_messages(self):
-        print("Stream processor started, waiting for messages...", flush=True)
+        logger.info("Stream processor started, waiting for messages...")
         
         while True:
             try:
-                # Read messages from stream (non-blocking via executor)
-                loop = asyncio.get_event_loop()
-                messages = await loop.run_in_executor(
-                    None,
-                    lambda: self.redis.xread({self.stream_name: self.last_id}, count=10, block=1000)
-                )
+                # block=0 waits until a bid arrives instead of waking up every second
+                messages = await self.redis.xread({self.stream_name: self.last_id}, count=10, block=0)
                 
                 if not messages:
                     continue
                 
                 for stream, msgs in messages:
+                    parsed = []
                     for msg_id, fields in msgs:
                         try:
-                            bid_data = self._parse_message(fields)
-                            await self.manager.broadcast(json.dumps({
-                                "type": "new_bid",
-                                "data": bid_data
-                            }))
-                            self.last_id = msg_id
+                            bid_data = parse_stream_entry(msg_id, fields)
                         except Exception as e:
-                            print(f"Error processing message {msg_id}: {e}", flush=True)
+                            logger.error("Error processing message %s: %s", msg_id.decode(), e)
+                            continue
+                        if self.bid_service:
+                            self.bid_service.update_cached_highest(bid_data)
+                            self.bid_service.add_to_history(bid_data)
+                        parsed.append(bid_data)
+                    
+                    self.last_id = msgs[-1][0]
+                    if parsed:
+                        # One frame per batch instead of one per bid
+                        await self.manager.broadcast(orjson.dumps({
+                            "type": "new_bids",
+                            "data": parsed
+                        }))
             
+            except asyncio.CancelledError:
+                logger.info("Stream processor stopped")
+                break
             except redis.ResponseError as e:
-                print(f"Redis error: {e}", flush=True)
+                logger.error("Redis error: %s", e)
                 await asyncio.sleep(1)
             except Exception as e:
-                print(f"Stream processing error: {e}", flush=True)
+                logger.error("Stream processing error: %s", e)
                 await asyncio.sleep(1)
-    
-    def _parse_message(self, fields) -> Dict:
-        if isinstance(fields, list):
-            field_dict = {}
-            for i in range(0, len(fields), 2):
-                if i + 1 < len(fields):
-                    field_dict[fields[i]] = fields[i + 1]
-            fields = field_dict
-        
-        return {
-            "bid_id": fields.get("bid_id") or "",
-            "bidder": fields.get("bidder") or "",
-            "amount": float(fields.get("amount", 0)),
-            "timestamp": fields.get("timestamp") or ""
-        }
-
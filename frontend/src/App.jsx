@@ -6,6 +6,8 @@ const WS_URL = process.env.REACT_APP_WS_URL ||
     ? 'ws://localhost:88/ws/bid' 
     : `${window.location.protocol === 'https:' ? 'wss:' : 'ws:'}//${window.location.host}/ws/bid`);
 
+const textDecoder = new TextDecoder();
+
 function App() {
   const [bidderName, setBidderName] = useState('');
   const [bidAmount, setBidAmount] = useState('');
@@ -19,6 +21,7 @@ function App() {
     // Connect WebSocket
     const connect = () => {
       const ws = new WebSocket(WS_URL);
+      ws.binaryType = 'arraybuffer';
       wsRef.current = ws;
 
       ws.onopen = () => {
@@ -28,25 +31,28 @@ function App() {
       
       ws.onmessage = (event) => {
         try {
-          const data = JSON.parse(event.data);
+          // Server sends pre-encoded JSON as binary frames
+          const raw = typeof event.data === 'string' ? event.data : textDecoder.decode(event.data);
+          const data = JSON.parse(raw);
           
           if (data.type === 'initial_state') {
             setHighestBid(data.data.highest_bid || { amount: 0, bidder: null, timestamp: null, bid_id: null });
             setBidHistory(data.data.history || []);
-          } else if (data.type === 'new_bid' || data.type === 'bid_accepted') {
-            const newBid = data.data;
+          } else if (data.type === 'new_bid' || data.type === 'new_bids' || data.type === 'bid_accepted') {
+            // new_bids carries a batch in stream order (oldest first)
+            const newBids = data.type === 'new_bids' ? data.data : [data.data];
             
-            setHighestBid(prev => {
-              if (!prev) return newBid;
-              const newAmount = parseFloat(newBid.amount);
-              const prevAmount = parseFloat(prev.amount || 0);
-              return newAmount > prevAmount ? newBid : prev;
-            });
+            setHighestBid(prev => newBids.reduce((best, bid) => {
+              if (!best) return bid;
+              return bid.amount > (best.amount || 0) ? bid : best;
+            }, prev));
             
             setBidHistory(prev => {
-              const exists = prev.some(b => b.bid_id === newBid.bid_id);
-              if (exists) return prev;
-              const updated = [newBid, ...prev];
+              const fresh = newBids
+                .filter(bid => !prev.some(b => b.bid_id === bid.bid_id))
+                .reverse();
+              if (fresh.length === 0) return prev;
+              const updated = [...fresh, ...prev];
               return updated.slice(0, 50);
             });
             
@@ -100,8 +106,9 @@ function App() {
       return;
     }
 
-    if (highestBid && amount <= parseFloat(highestBid.amount || 0)) {
-      setError(`Bid must be higher than current highest bid ($${parseFloat(highestBid.amount).toFixed(2)})`);
+    // Server amounts are integer cents
+    if (highestBid && Math.round(amount * 100) <= (highestBid.amount || 0)) {
+      setError(`Bid must be higher than current highest bid (${formatAmount(highestBid.amount)})`);
       return;
     }
 
@@ -116,9 +123,9 @@ function App() {
     }
   };
 
-  const formatAmount = (amount) => {
-    if (!amount) return '$0.00';
-    return `$${parseFloat(amount).toFixed(2)}`;
+  const formatAmount = (cents) => {
+    if (!cents) return '$0.00';
+    return `$${(cents / 100).toFixed(2)}`;
   };
 
   const formatTimestamp = (timestamp) => {